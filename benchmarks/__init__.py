@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# 基于离线合成数据的性能基准测试，运行方式: python -m benchmarks --help
@@ -0,0 +1,170 @@
+# benchmarks/__main__.py
+# 基准测试入口：生成/复用合成输入，对真实代码路径计时并输出 JSON
+# 用法: python -m benchmarks [--quick] [--only srt_parse ...] [-o results.json] [--compare baseline.json]
+
+import os, sys, json, time, random, argparse, platform, statistics, subprocess, tempfile
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path: sys.path.insert(0, str(ROOT_DIR))
+
+from utils import format_time, parse_time, parse_srt
+from benchmarks.synthetic import make_media, make_srt, make_subtitles
+from benchmarks.mock_openai import MockOpenAIServer
+
+CASES = ["time_format", "srt_parse", "srt_serialize", "populate_table", "update_all_regions", "audio", "resync", "translation"]
+
+def measure(fn, repeat, setup=None):
+    """重复执行 fn 并返回耗时统计(秒)；setup 在每次计时前调用，不计入耗时"""
+    timings = []
+    for _ in range(repeat):
+        if setup: setup()
+        start = time.perf_counter(); fn(); timings.append(time.perf_counter() - start)
+    return {'repeat': repeat, 'min_s': min(timings), 'median_s': statistics.median(timings), 'mean_s': statistics.fmean(timings)}
+
+def record(results, case, params, items, stats):
+    entry = {'case': case, 'params': params, 'items': items, **stats, 'items_per_s': items / stats['median_s'] if stats['median_s'] > 0 else None}
+    results.append(entry)
+    print(f"  {case:<20} {json.dumps(params, ensure_ascii=False):<48} median {stats['median_s'] * 1000:10.2f} ms", flush=True)
+
+def get_qt_app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+# --- 各基准用例 ---
+def bench_time_format(args, results):
+    rng = random.Random(args.seed); values = [rng.uniform(0, 4 * 3600) for _ in range(args.time_values)]; stamps = [format_time(v) for v in values]
+    record(results, "format_time", {'values': len(values)}, len(values), measure(lambda: [format_time(v) for v in values], args.repeat))
+    record(results, "parse_time", {'values': len(stamps)}, len(stamps), measure(lambda: [parse_time(s) for s in stamps], args.repeat))
+
+def bench_srt_parse(args, results):
+    for count in args.cue_counts:
+        srt_path = make_srt(args.data_dir / f"cues_{count}_seed{args.seed}.srt", count, args.seed)
+        def run():
+            with open(srt_path, 'r', encoding='utf-8') as f: parse_srt(f.read())
+        record(results, "load_srt", {'cues': count}, count, measure(run, args.repeat))
+
+def bench_srt_serialize(args, results):
+    import config, main
+    from main import MainWindow
+    # 调用真实的 MainWindow.save_srt / update_srt_cache：只构造它们用到的属性，并替换掉对话框
+    def fail(*a, **k): raise RuntimeError(a[-1])
+    status_bar = SimpleNamespace(showMessage=lambda *a, **k: None); message_box = SimpleNamespace(warning=fail, critical=fail)
+    labels = {"original": "仅原文", "translation": "仅译文", "bilingual": "双语 (译文在上)"}
+    with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.object(config, 'CACHE_DIR', Path(tmp_dir)), mock.patch.object(main, 'QMessageBox', message_box):
+        save_path = str(Path(tmp_dir) / "saved.srt")
+        for count in args.cue_counts:
+            window = SimpleNamespace(subtitles=make_subtitles(count, args.seed), media_path=Path(tmp_dir) / "media.mkv", status_bar=status_bar)
+            for mode, label in labels.items():
+                with mock.patch.object(main, 'QInputDialog', SimpleNamespace(getItem=lambda *a, **k: (label, True))), mock.patch.object(main, 'QFileDialog', SimpleNamespace(getSaveFileName=lambda *a, **k: (save_path, "SRT (*.srt)"))):
+                    record(results, "save_srt", {'cues': count, 'mode': mode}, count, measure(lambda: MainWindow.save_srt(window), args.repeat))
+            record(results, "update_srt_cache", {'cues': count}, count, measure(lambda: MainWindow.update_srt_cache(window), args.repeat))
+
+def bench_populate_table(args, results):
+    get_qt_app()
+    from PyQt6.QtWidgets import QTableWidget
+    from main import MainWindow
+    for count in [c for c in args.cue_counts if c <= args.gui_max_cues]:
+        # 只构造 populate_table 用到的属性，避免创建 VLC 实例
+        window = SimpleNamespace(subtitle_table=QTableWidget(0, 5), subtitles=make_subtitles(count, args.seed)); window.fill_table_rows = lambda first_row: MainWindow.fill_table_rows(window, first_row)
+        record(results, "populate_table", {'cues': count}, count, measure(lambda: MainWindow.populate_table(window), args.repeat))
+        window.subtitle_table.deleteLater()
+
+def bench_update_all_regions(args, results):
+    get_qt_app()
+    from widgets import AudioVisualizer
+    for count in [c for c in args.cue_counts if c <= args.gui_max_cues]:
+        visualizer = AudioVisualizer(); subtitles = make_subtitles(count, args.seed)
+        record(results, "update_all_regions", {'cues': count}, count, measure(lambda: visualizer.update_all_regions(subtitles), args.repeat))
+        visualizer.deleteLater()
+
+def bench_audio(args, results):
+    import numpy as np, ffmpeg
+    from workers import AudioWorker, compute_waveform_envelope
+    for duration in args.media_durations:
+        media_path = make_media(args.data_dir / f"tone_noise_{duration}s.m4a", duration)
+        output = []; errors = []
+        worker = AudioWorker(media_path); worker.finished.connect(output.append); worker.error.connect(errors.append)
+        # 直接在当前线程调用 run()，信号为直接连接，计时只包含解码和归约本身
+        record(results, "audio_worker", {'duration_s': duration}, duration, measure(worker.run, args.repeat))
+        if errors: raise RuntimeError(errors[0])
+        out, _ = ffmpeg.input(str(media_path)).output('-', format='f32le', acodec='pcm_f32le', ac=1, ar=16000).run(cmd='ffmpeg', capture_stdout=True, capture_stderr=True)
+        pcm = np.frombuffer(out, dtype=np.float32)
+        record(results, "waveform_envelope", {'duration_s': duration}, duration, measure(lambda: compute_waveform_envelope(pcm), args.repeat))
+
+def bench_resync(args, results):
+    import numpy as np
+    from resync import estimate_resync, cue_activity
+    rng = np.random.default_rng(args.seed); hop = 1024 / 16000.0
+    for duration in args.media_durations:
+        # 用字幕时间轴 (整体偏移 +12.5 秒、帧率 23.976->25) 合成 RMS 包络，模拟新版本媒体
+        subtitles = [sub for sub in make_subtitles(int(duration / 3.5), args.seed) if sub['end_sec'] < duration]
+        starts = np.array([sub['start_sec'] for sub in subtitles]); ends = np.array([sub['end_sec'] for sub in subtitles]); scale = 24000 / 1001 / 25
+        length = int(duration / hop); activity = cue_activity(starts * scale + 12.5, ends * scale + 12.5, hop, length)[0]
+        rms = 0.01 + 0.3 * activity * np.abs(rng.normal(1.0, 0.4, length)) + 0.005 * rng.random(length)
+        time_axis = np.arange(length) * hop
+        record(results, "estimate_resync", {'duration_s': duration, 'cues': len(subtitles)}, len(subtitles), measure(lambda: estimate_resync(time_axis, rms, starts, ends), args.repeat))
+
+def bench_translation(args, results):
+    import config
+    from workers import TranslationWorker
+    subtitles = make_subtitles(args.translation_cues, args.seed)
+    with MockOpenAIServer(latency=args.translation_latency) as server:
+        for use_context in (False, True):
+            prompt = config.DEFAULT_CONTEXT_TRANSLATION_PROMPT if use_context else config.DEFAULT_STANDARD_TRANSLATION_PROMPT
+            api_config = {'base': server.base_url, 'key': 'bench', 'model': 'bench', 'use_context': use_context, 'prompt': prompt, 'context_lines': 3}
+            translated = []; errors = []
+            worker = TranslationWorker(subtitles, list(range(len(subtitles))), api_config); worker.segment_translated.connect(lambda i, text: translated.append(i)); worker.error.connect(errors.append)
+            record(results, "translation_worker", {'cues': len(subtitles), 'use_context': use_context, 'latency_s': args.translation_latency}, len(subtitles), measure(worker.run, args.repeat, setup=translated.clear))
+            if errors: raise RuntimeError(errors[0])
+
+# --- 结果输出与对比 ---
+def collect_meta(args):
+    try: commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError: commit = None
+    return {'timestamp': datetime.now().isoformat(timespec='seconds'), 'git_commit': commit, 'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(), 'cpu_count': os.cpu_count(),
+            'args': {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()}}
+
+def compare(baseline_path, results):
+    with open(baseline_path, 'r', encoding='utf-8') as f: baseline = json.load(f)
+    key = lambda r: (r['case'], json.dumps(r['params'], sort_keys=True))
+    base_map = {key(r): r for r in baseline.get('results', [])}
+    print(f"\n与基线对比: {baseline_path} (比值 < 1 表示更快)")
+    for r in results:
+        if (base := base_map.get(key(r))): print(f"  {r['case']:<20} {key(r)[1]:<48} {base['median_s'] * 1000:10.2f} ms -> {r['median_s'] * 1000:10.2f} ms  x{r['median_s'] / base['median_s']:.3f}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Simple Subtitle Maker 性能基准测试")
+    parser.add_argument("--quick", action="store_true", help="使用较小的输入规模快速跑一遍")
+    parser.add_argument("--only", nargs="+", choices=CASES, default=CASES, help="只运行指定的用例")
+    parser.add_argument("--media-durations", nargs="+", type=int, default=[600, 3600, 14400], help="合成媒体时长(秒)")
+    parser.add_argument("--cue-counts", nargs="+", type=int, default=[100, 1000, 10000, 100000], help="随机 SRT 的字幕条数")
+    parser.add_argument("--gui-max-cues", type=int, default=10000, help="表格/波形区域用例的最大条数")
+    parser.add_argument("--time-values", type=int, default=100000, help="format_time/parse_time 的调用次数")
+    parser.add_argument("--translation-cues", type=int, default=200, help="翻译用例的字幕条数")
+    parser.add_argument("--translation-latency", type=float, default=0.0, help="模拟 API 每次请求的延迟(秒)")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例的重复次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机数种子，保证输入可复现")
+    parser.add_argument("--data-dir", type=Path, default=Path(__file__).resolve().parent / "data", help="合成输入的缓存目录")
+    parser.add_argument("-o", "--output", type=Path, default=Path("benchmark_results.json"), help="结果 JSON 路径")
+    parser.add_argument("--compare", type=Path, help="与之前的结果 JSON 对比")
+    args = parser.parse_args(argv)
+    if args.quick: args.media_durations = [600]; args.cue_counts = [100, 1000]; args.time_values = 10000; args.translation_cues = 50
+    return args
+
+def main(argv=None):
+    args = parse_args(argv); results = []
+    for case in CASES:
+        if case not in args.only: continue
+        print(f"[{case}]", flush=True)
+        globals()[f"bench_{case}"](args, results)
+    with open(args.output, 'w', encoding='utf-8') as f: json.dump({'meta': collect_meta(args), 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已写入: {args.output}")
+    if args.compare: compare(args.compare, results)
+
+if __name__ == '__main__':
+    main()
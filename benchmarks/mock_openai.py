@@ -0,0 +1,30 @@
+# benchmarks/mock_openai.py
+# 本地模拟的 OpenAI 兼容接口，只实现 TranslationWorker 用到的 /chat/completions
+
+import json, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+        if self.server.latency: time.sleep(self.server.latency)
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        payload = json.dumps({
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": body.get('model', 'bench'),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": f"译文 {len(prompt)}"}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode('utf-8')
+        self.send_response(200); self.send_header('Content-Type', 'application/json'); self.send_header('Content-Length', str(len(payload))); self.end_headers()
+        self.wfile.write(payload)
+    def log_message(self, format, *args): pass
+
+class MockOpenAIServer:
+    """在后台线程中监听 127.0.0.1 的随机端口，latency 为每个请求的模拟延迟(秒)"""
+    def __init__(self, latency=0.0):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler); self.httpd.latency = latency; self.thread = None
+    @property
+    def base_url(self): return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True); self.thread.start(); return self
+    def __exit__(self, *exc):
+        self.httpd.shutdown(); self.httpd.server_close(); self.thread.join()
@@ -0,0 +1,42 @@
+# benchmarks/synthetic.py
+# 离线生成基准测试所需的合成媒体和随机 SRT
+
+import random
+from pathlib import Path
+import ffmpeg
+
+from utils import format_time, compose_srt
+
+WORDS = ["the", "subtitle", "timing", "whisper", "model", "audio", "frame", "scene", "night", "city", "river", "signal", "we", "should", "never", "again", "maybe", "tomorrow", "字幕", "时间轴", "翻译", "测试", "你好", "世界"]
+
+def make_media(path, duration_sec, sample_rate=44100):
+    """用 lavfi 合成「间歇音调 + 底噪」音频 (AAC)，音调每 4 秒响 2.5 秒，粗略模拟语音的起伏"""
+    path = Path(path)
+    if path.exists(): return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tone = ffmpeg.input(f"aevalsrc=exprs=0.5*sin(2*PI*440*t)*lt(mod(t\\,4)\\,2.5):s={sample_rate}:d={duration_sec}", f='lavfi')
+    noise = ffmpeg.input(f"anoisesrc=a=0.05:c=pink:r={sample_rate}:d={duration_sec}", f='lavfi')
+    tmp_path = path.with_name(path.stem + ".part" + path.suffix)
+    (ffmpeg.filter([tone, noise], 'amix', inputs=2, duration='shortest')
+     .output(str(tmp_path), acodec='aac', audio_bitrate='96k', ac=2)
+     .run(cmd='ffmpeg', capture_stdout=True, capture_stderr=True, overwrite_output=True))
+    tmp_path.replace(path)
+    return path
+
+def make_subtitles(count, seed=0, translated_ratio=0.5):
+    """生成 count 条时间递增、长度随机的字幕字典，结构与 MainWindow.subtitles 相同"""
+    rng = random.Random(seed); subtitles = []; cursor = 0.0
+    for i in range(count):
+        start_sec = cursor + rng.uniform(0.05, 1.5); end_sec = start_sec + rng.uniform(0.6, 6.0); cursor = end_sec
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 14)))
+        translation = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 10))) if rng.random() < translated_ratio else ''
+        subtitles.append({'index': i + 1, 'start_sec': start_sec, 'end_sec': end_sec, 'start_time': format_time(start_sec), 'end_time': format_time(end_sec), 'text': text, 'translation': translation})
+    return subtitles
+
+def make_srt(path, count, seed=0):
+    """将 make_subtitles 的结果按缓存格式(双语)写入 SRT 文件"""
+    path = Path(path)
+    if path.exists(): return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f: f.write(compose_srt(make_subtitles(count, seed), "bilingual"))
+    return path
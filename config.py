@@ -3,6 +3,7 @@
 
 import os
 import json
+import platform
 from pathlib import Path
 
 # --- 默认翻译提示词 ---
@@ -30,6 +31,9 @@ DEFAULT_SETTINGS = {
     "vlc_path": r"C:\Program Files\VideoLAN\VLC",
     "ffmpeg_path": r"H:\TOOLS\fffgui\ffmpeg.exe",
     "models_dir": "./models",
+    # 播放代理设置
+    "use_proxy_media": True,  # 新增：后台生成低分辨率全帧内代理，用于快速拖动/定位
+    "proxy_height": 360,
     # Whisper 转写参数
     "beam_size": 5,
     "vad_min_silence_ms": 500,
@@ -102,6 +106,28 @@ VLC_INSTALL_DIR = SETTINGS.get("vlc_path")
 FFMPEG_PATH = SETTINGS.get("ffmpeg_path")
 MODELS_DIR = Path(SETTINGS.get("models_dir"))
 CACHE_DIR = Path("./whisper_cache")
+CALIBRATION_FILE = CACHE_DIR / "calibration.json"
+
+def _calibration_key(model_name):
+    return f"{platform.node()}|{model_name}"
+
+def load_calibration(model_name):
+    """读取本机针对指定模型的校准结果，没有则返回 None"""
+    if not CALIBRATION_FILE.exists(): return None
+    try:
+        with open(CALIBRATION_FILE, 'r', encoding='utf-8') as f: return json.load(f).get(_calibration_key(model_name))
+    except (OSError, json.JSONDecodeError, AttributeError): return None
+
+def save_calibration(model_name, result):
+    """按 (主机名, 模型) 保存校准结果，保留其他主机/模型的记录"""
+    all_results = {}
+    if CALIBRATION_FILE.exists():
+        try:
+            with open(CALIBRATION_FILE, 'r', encoding='utf-8') as f: all_results = json.load(f)
+        except (OSError, json.JSONDecodeError): all_results = {}
+    all_results[_calibration_key(model_name)] = result
+    CALIBRATION_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(CALIBRATION_FILE, 'w', encoding='utf-8') as f: json.dump(all_results, f, indent=4, ensure_ascii=False)
 
 def setup_environment():
     """初始化文件夹和环境变量"""
@@ -1,7 +1,7 @@
 # main.py
 # 主应用程序窗口和入口点
 
-import sys, os, re, time, contextlib
+import sys, os, time, contextlib, multiprocessing
 import gc
 from pathlib import Path
 try: import torch
@@ -11,20 +11,22 @@ from faster_whisper import WhisperModel
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QProgressDialog, QMessageBox, QLabel, QStyle, QComboBox, QStatusBar, QToolButton, QSlider, QMenu, QInputDialog)
 from PyQt6.QtCore import Qt, QTimer, QPoint
 import config
-from utils import format_time, parse_time
-from workers import AudioWorker, TranscriptionWorker, RetranscribeWorker, TranslationWorker
-from widgets import AudioVisualizer, EditDialog, SettingsDialog
+from utils import format_time, parse_srt, compose_srt
+from workers import AudioWorker, ProxyWorker, is_proxy_current, TranscriptionWorker, RetranscribeWorker, TranslationWorker, CalibrationWorker, ResyncWorker, load_transcription_checkpoint, get_model_options, has_cuda
+from widgets import AudioVisualizer, EditDialog, SettingsDialog, UpdateBatcher
 
 pg.setConfigOptions(useOpenGL=True, antialias=True)
 
 class MainWindow(QMainWindow):
     def __init__(self):
-        super().__init__(); self.setWindowTitle("Whisper GUI 工具"); self.setGeometry(100, 100, 1400, 800); self.model = None; self.media_path = None; self.srt_path = None; self.subtitles = []; self.progress_dialog = None; self.active_dialog = None; self.media_duration_ms = 0; self.preview_end_time = None; self.animation_timer = QTimer(self); self.last_known_vlc_time_ms = 0; self.last_update_monotonic_time = 0
+        super().__init__(); self.setWindowTitle("Whisper GUI 工具"); self.setGeometry(100, 100, 1400, 800); self.model = None; self.media_path = None; self.srt_path = None; self.subtitles = []; self.progress_dialog = None; self.active_dialog = None; self.media_duration_ms = 0; self.preview_end_time = None; self.animation_timer = QTimer(self); self.last_known_vlc_time_ms = 0; self.last_update_monotonic_time = 0; self.pending_seek_ms = None
         # <<< 关键修复 3：规范化worker属性的初始化 >>>
-        self.audio_worker = None; self.transcription_worker = None; self.retranscribe_worker = None; self.translation_worker = None
+        self.audio_worker = None; self.proxy_worker = None; self.transcription_worker = None; self.retranscribe_worker = None; self.translation_worker = None; self.calibration_worker = None; self.resync_worker = None; self.waveform_data = None
         vlc_args = ['--quiet', '--avcodec-hw=none', '--vout=windib', '--no-one-instance', '--ignore-config', '--no-video-title-show']
         with open(os.devnull, 'w') as devnull:
             with contextlib.redirect_stderr(devnull): self.vlc_instance = vlc.Instance(vlc_args)
+        # 后台结果按帧合并后再批量写入表格/波形，界面响应与 worker 吞吐量无关
+        self.segment_batcher = UpdateBatcher(parent=self); self.segment_batcher.flushed.connect(self.add_subtitle_segments); self.translation_batcher = UpdateBatcher(parent=self); self.translation_batcher.flushed.connect(self.on_segments_translated)
         self.player = self.vlc_instance.media_player_new(); self.init_ui(); self.set_icons(); self.populate_model_combo()
     
     def init_ui(self):
@@ -38,9 +40,10 @@ class MainWindow(QMainWindow):
         self.translate_all_btn.setMenu(translate_all_menu)
         standard_action.triggered.connect(lambda: self.handle_full_translation(use_context=False))
         context_action.triggered.connect(lambda: self.handle_full_translation(use_context=True))
-        translation_layout.addWidget(self.translate_all_btn); right_layout.addLayout(translation_layout)
-        config_layout = QHBoxLayout(); config_layout.addWidget(QLabel("模型:")); self.model_combo = QComboBox(); config_layout.addWidget(self.model_combo, 1); self.refresh_models_btn = QToolButton(); self.refresh_models_btn.clicked.connect(self.populate_model_combo); config_layout.addWidget(self.refresh_models_btn); self.settings_btn = QPushButton("设置"); self.settings_btn.clicked.connect(self.open_settings_dialog); config_layout.addWidget(self.settings_btn); config_layout.addWidget(QLabel("设备:")); self.device_combo = QComboBox(); self.device_combo.addItems(["cuda", "cpu"]); config_layout.addWidget(self.device_combo); right_layout.addLayout(config_layout)
-        model_mgmt_layout = QHBoxLayout(); self.load_model_btn = QPushButton("加载模型"); self.load_model_btn.clicked.connect(self.load_whisper_model); self.unload_model_btn = QPushButton("卸载模型"); self.unload_model_btn.clicked.connect(self.unload_whisper_model); self.unload_model_btn.setEnabled(False); model_mgmt_layout.addWidget(self.load_model_btn); model_mgmt_layout.addWidget(self.unload_model_btn); right_layout.addLayout(model_mgmt_layout)
+        self.resync_btn = QPushButton("整体对齐..."); self.resync_btn.setToolTip("根据当前音频的语音活动，自动估计整体偏移、帧率变化和分段偏移，\n将全部字幕一次性对齐到新版本的媒体。"); self.resync_btn.clicked.connect(self.start_resync)
+        translation_layout.addWidget(self.translate_all_btn); translation_layout.addWidget(self.resync_btn); right_layout.addLayout(translation_layout)
+        config_layout = QHBoxLayout(); config_layout.addWidget(QLabel("模型:")); self.model_combo = QComboBox(); config_layout.addWidget(self.model_combo, 1); self.refresh_models_btn = QToolButton(); self.refresh_models_btn.clicked.connect(self.populate_model_combo); config_layout.addWidget(self.refresh_models_btn); self.settings_btn = QPushButton("设置"); self.settings_btn.clicked.connect(self.open_settings_dialog); config_layout.addWidget(self.settings_btn); config_layout.addWidget(QLabel("设备:")); self.device_combo = QComboBox(); self.device_combo.addItems(["cuda", "cpu"]); config_layout.addWidget(self.device_combo); self.model_combo.currentTextChanged.connect(self.apply_calibrated_defaults); right_layout.addLayout(config_layout)
+        model_mgmt_layout = QHBoxLayout(); self.load_model_btn = QPushButton("加载模型"); self.load_model_btn.clicked.connect(self.load_whisper_model); self.unload_model_btn = QPushButton("卸载模型"); self.unload_model_btn.clicked.connect(self.unload_whisper_model); self.unload_model_btn.setEnabled(False); self.calibrate_btn = QPushButton("自动校准"); self.calibrate_btn.setToolTip("在本机测试不同设备/精度/线程数组合，记住当前模型最快的配置"); self.calibrate_btn.clicked.connect(self.start_calibration); model_mgmt_layout.addWidget(self.load_model_btn); model_mgmt_layout.addWidget(self.unload_model_btn); model_mgmt_layout.addWidget(self.calibrate_btn); right_layout.addLayout(model_mgmt_layout)
         self.subtitle_table = QTableWidget(); self.subtitle_table.setColumnCount(5); self.subtitle_table.setHorizontalHeaderLabels(["序号", "开始", "结束", "原文", "译文"]); self.subtitle_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows); self.subtitle_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers); self.subtitle_table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection); header = self.subtitle_table.horizontalHeader(); header.setSectionResizeMode(0, QHeaderView.ResizeMode.ResizeToContents); header.setSectionResizeMode(1, QHeaderView.ResizeMode.ResizeToContents); header.setSectionResizeMode(2, QHeaderView.ResizeMode.ResizeToContents); header.setSectionResizeMode(3, QHeaderView.ResizeMode.Stretch); header.setSectionResizeMode(4, QHeaderView.ResizeMode.Stretch); self.subtitle_table.cellClicked.connect(self.jump_to_timestamp); self.subtitle_table.cellDoubleClicked.connect(self.edit_subtitle); self.subtitle_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu); self.subtitle_table.customContextMenuRequested.connect(self.show_context_menu); right_layout.addWidget(self.subtitle_table)
         save_layout = QHBoxLayout(); self.update_cache_btn = QPushButton("更新缓存"); self.update_cache_btn.clicked.connect(self.update_srt_cache); self.save_btn = QPushButton("保存SRT文件"); self.save_btn.clicked.connect(self.save_srt); save_layout.addWidget(self.update_cache_btn); save_layout.addWidget(self.save_btn); right_layout.addLayout(save_layout)
         main_layout.addLayout(left_layout, 2); main_layout.addLayout(right_layout, 1); self.status_bar = QStatusBar(); self.setStatusBar(self.status_bar); self.player.set_hwnd(int(self.video_frame.winId()))
@@ -72,21 +75,46 @@ class MainWindow(QMainWindow):
             if not prompt_template: self.show_critical_error("未找到有效的标准提示词，请在设置中检查。"); return
             api_config = { **base_config, 'use_context': False, 'prompt': prompt_template }
         indices_to_process = [self.subtitles.index(sub) for sub in subs_to_translate]
-        self.translation_worker = TranslationWorker(self.subtitles, indices_to_process, api_config, self); self.translation_worker.segment_translated.connect(self.on_segment_translated); self.translation_worker.finished.connect(self.on_translation_finished); self.translation_worker.error.connect(self.on_translation_error); self.translation_worker.start()
-    def on_segment_translated(self, row_index, translated_text):
-        self.subtitles[row_index]['translation'] = translated_text; self.subtitle_table.setItem(row_index, 4, QTableWidgetItem(translated_text)); self.subtitle_table.selectRow(row_index)
-        if self.progress_dialog: self.progress_dialog.setValue(self.progress_dialog.value() + 1)
+        self.translation_worker = TranslationWorker(self.subtitles, indices_to_process, api_config, self); self.translation_worker.segment_translated.connect(self.translation_batcher.add, Qt.ConnectionType.DirectConnection); self.translation_worker.finished.connect(self.on_translation_finished); self.translation_worker.error.connect(self.on_translation_error); self.translation_worker.start()
+    def on_segments_translated(self, results):
+        self.subtitle_table.setUpdatesEnabled(False)
+        for row_index, translated_text in results: self.subtitles[row_index]['translation'] = translated_text; self.subtitle_table.setItem(row_index, 4, QTableWidgetItem(translated_text))
+        self.subtitle_table.setUpdatesEnabled(True); self.subtitle_table.selectRow(results[-1][0])
+        if self.progress_dialog: self.progress_dialog.setValue(self.progress_dialog.value() + len(results))
     def on_translation_finished(self):
+        self.translation_batcher.flush()
         self.status_bar.showMessage("翻译完成！", 5000)
         if self.progress_dialog: self.progress_dialog.close(); self.progress_dialog = None
         self.translation_worker = None
     def on_translation_error(self, error_msg):
+        self.translation_batcher.flush()
         self.show_critical_error(f"翻译失败: {error_msg}")
         if self.progress_dialog: self.progress_dialog.close(); self.progress_dialog = None
         self.translation_worker = None
     def cancel_translation(self):
         if self.translation_worker: self.translation_worker.stop(); self.status_bar.showMessage("翻译已取消", 5000)
 
+    # --- 整体对齐 ---
+    def start_resync(self):
+        if self.waveform_data is None or not len(self.waveform_data[0]): QMessageBox.warning(self, "警告", "请先打开媒体并等待音频加载完成。"); return
+        if len(self.subtitles) < 5: QMessageBox.warning(self, "警告", "字幕太少（至少需要 5 条），无法自动对齐。"); return
+        if self.resync_worker and self.resync_worker.isRunning(): return
+        self.resync_btn.setEnabled(False); self.status_bar.showMessage("正在估计字幕偏移...")
+        self.resync_worker = ResyncWorker(self.waveform_data, self.subtitles, self); self.resync_worker.finished.connect(self.on_resync_finished); self.resync_worker.error.connect(self.on_resync_error); self.resync_worker.start()
+    def on_resync_finished(self, result):
+        self.resync_btn.setEnabled(True); self.resync_worker = None; self.status_bar.clearMessage()
+        if len(result['starts']) != len(self.subtitles): QMessageBox.warning(self, "操作失败", "估计期间字幕已被修改，请重新执行整体对齐。"); return
+        low_confidence = result['confidence'] < 0.2
+        summary = f"帧率比例: {result['scale']:.5f}\n整体偏移: {result['offset']:+.3f} 秒\n线性漂移: {result['drift'] * 1e6:+.0f} ppm\n置信度: {result['confidence']:.2f}" + ("（较低，结果可能不可靠）" if low_confidence else "")
+        if len(result['segments']) > 1: summary += f"\n\n检测到 {len(result['segments'])} 个分段:\n" + "\n".join(f"  自 {format_time(seg['start'])} 起 额外修正 {seg['offset']:+.3f} 秒" for seg in result['segments'][:10])
+        # 置信度较低时默认选中“否”，避免误按回车把不可靠的结果应用到全部字幕
+        reply = QMessageBox.question(self, "整体对齐", f"{summary}\n\n是否将结果应用到全部 {len(self.subtitles)} 条字幕？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No if low_confidence else QMessageBox.StandardButton.Yes)
+        if reply != QMessageBox.StandardButton.Yes: return
+        for sub, start_sec, end_sec in zip(self.subtitles, result['starts'].tolist(), result['ends'].tolist()): sub.update({'start_sec': start_sec, 'end_sec': end_sec, 'start_time': format_time(start_sec), 'end_time': format_time(end_sec)})
+        self.populate_table(); self.audio_canvas.update_all_regions(self.subtitles); self.status_bar.showMessage("字幕已整体对齐，确认无误后请点击“更新缓存”保存。", 8000)
+    def on_resync_error(self, error_msg):
+        self.resync_btn.setEnabled(True); self.resync_worker = None; self.status_bar.clearMessage(); QMessageBox.critical(self, "错误", error_msg)
+
     # --- 右键菜单和表格操作 ---
     def show_context_menu(self, position: QPoint):
         selected_rows = sorted(list(set(item.row() for item in self.subtitle_table.selectedItems())));
@@ -108,12 +136,18 @@ class MainWindow(QMainWindow):
         else: 
             menu.addAction("合并选中行").triggered.connect(lambda: self.handle_merge_rows(selected_rows))
         menu.exec(self.subtitle_table.viewport().mapToGlobal(position))
-    def add_subtitle_segment(self, segment_data):
-        segment_data['translation'] = ''; self.subtitles.append(segment_data); row_count = self.subtitle_table.rowCount(); self.subtitle_table.insertRow(row_count); self.subtitle_table.setItem(row_count, 0, QTableWidgetItem(str(segment_data['index']))); self.subtitle_table.setItem(row_count, 1, QTableWidgetItem(segment_data['start_time'])); self.subtitle_table.setItem(row_count, 2, QTableWidgetItem(segment_data['end_time'])); self.subtitle_table.setItem(row_count, 3, QTableWidgetItem(segment_data['text'])); self.subtitle_table.setItem(row_count, 4, QTableWidgetItem('')); self.subtitle_table.scrollToBottom()
+    def add_subtitle_segments(self, segments):
+        first_row = len(self.subtitles)
+        for segment_data in segments: segment_data['translation'] = ''; self.subtitles.append(segment_data)
+        self.fill_table_rows(first_row); self.subtitle_table.scrollToBottom(); self.audio_canvas.add_regions(self.subtitles, first_row)
     def populate_table(self):
-        self.subtitle_table.setRowCount(0)
-        for sub in self.subtitles:
-            row_count = self.subtitle_table.rowCount(); self.subtitle_table.insertRow(row_count); self.subtitle_table.setItem(row_count, 0, QTableWidgetItem(str(sub['index']))); self.subtitle_table.setItem(row_count, 1, QTableWidgetItem(sub['start_time'])); self.subtitle_table.setItem(row_count, 2, QTableWidgetItem(sub['end_time'])); self.subtitle_table.setItem(row_count, 3, QTableWidgetItem(sub['text'])); self.subtitle_table.setItem(row_count, 4, QTableWidgetItem(sub.get('translation', '')))
+        self.subtitle_table.setRowCount(0); self.fill_table_rows(0)
+    def fill_table_rows(self, first_row):
+        # 一次性设定行数并暂停重绘，避免逐行 insertRow 触发的布局和刷新
+        self.subtitle_table.setUpdatesEnabled(False); self.subtitle_table.setRowCount(len(self.subtitles))
+        for row_count in range(first_row, len(self.subtitles)):
+            sub = self.subtitles[row_count]; self.subtitle_table.setItem(row_count, 0, QTableWidgetItem(str(sub['index']))); self.subtitle_table.setItem(row_count, 1, QTableWidgetItem(sub['start_time'])); self.subtitle_table.setItem(row_count, 2, QTableWidgetItem(sub['end_time'])); self.subtitle_table.setItem(row_count, 3, QTableWidgetItem(sub['text'])); self.subtitle_table.setItem(row_count, 4, QTableWidgetItem(sub.get('translation', '')))
+        self.subtitle_table.setUpdatesEnabled(True)
     def edit_subtitle(self, row, column):
         if row < len(self.subtitles):
             self.active_dialog = EditDialog(self.subtitles[row], row, self)
@@ -152,21 +186,16 @@ class MainWindow(QMainWindow):
     def open_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "打开媒体文件");
         if not file_path: return
-        self.progress_dialog = QProgressDialog("正在处理/读取音频...", "取消", 0, 0, self); self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal); self.progress_dialog.setWindowTitle("请稍候"); self.progress_dialog.show(); self.media_path = Path(file_path); self.subtitles.clear(); self.subtitle_table.setRowCount(0); self.setWindowTitle(f"Whisper GUI 工具 - {self.media_path.name}"); self.audio_worker = AudioWorker(self.media_path, self); self.audio_worker.finished.connect(self.on_audio_loaded); self.audio_worker.error.connect(self.show_critical_error); self.audio_worker.start(); cached_srt_path = config.CACHE_DIR / (self.media_path.stem + ".srt");
+        self.progress_dialog = QProgressDialog("正在处理/读取音频...", "取消", 0, 0, self); self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal); self.progress_dialog.setWindowTitle("请稍候"); self.progress_dialog.show(); self.media_path = Path(file_path); self.waveform_data = None; self.subtitles.clear(); self.subtitle_table.setRowCount(0); self.setWindowTitle(f"Whisper GUI 工具 - {self.media_path.name}"); self.audio_worker = AudioWorker(self.media_path, self); self.audio_worker.finished.connect(self.on_audio_loaded); self.audio_worker.error.connect(self.show_critical_error); self.audio_worker.start(); cached_srt_path = config.CACHE_DIR / (self.media_path.stem + ".srt");
         if cached_srt_path.exists(): self.load_srt(srt_path=str(cached_srt_path))
-        self.load_media()
+        self.load_media(); self.start_proxy_generation()
     def load_srt(self, srt_path=None):
         path_to_load = srt_path if srt_path else self.srt_path;
         if not path_to_load: return
         self.subtitles.clear()
         try:
             with open(path_to_load, 'r', encoding='utf-8') as f: content = f.read()
-            pattern = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n(.*?)\n\n', re.DOTALL)
-            for match in pattern.finditer(content):
-                text_block = match.group(4).strip().split('\n'); original_text = ''; translation = ''
-                if len(text_block) > 1 and text_block[0] and text_block[1]: translation = text_block[0]; original_text = '\n'.join(text_block[1:])
-                else: original_text = '\n'.join(text_block)
-                self.subtitles.append({'index': int(match.group(1)), 'start_time': match.group(2), 'end_time': match.group(3), 'start_sec': parse_time(match.group(2)), 'end_sec': parse_time(match.group(3)), 'text': original_text, 'translation': translation})
+            self.subtitles.extend(parse_srt(content))
             self.populate_table(); self.srt_path = path_to_load; self.status_bar.showMessage(f"已加载字幕: {Path(path_to_load).name}", 5000); self.audio_canvas.update_all_regions(self.subtitles)
         except Exception as e: QMessageBox.critical(self, "错误", f"加载SRT失败: {e}")
     def import_srt_file(self):
@@ -180,28 +209,20 @@ class MainWindow(QMainWindow):
         default_name = self.media_path.stem + ".srt" if self.media_path else "subtitles.srt"; save_path, _ = QFileDialog.getSaveFileName(self, "保存SRT文件", default_name, "SRT (*.srt)")
         if not save_path: return
         try:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                for sub in self.subtitles:
-                    text_to_write = ""
-                    if item == "仅原文": text_to_write = sub['text']
-                    elif item == "仅译文": text_to_write = sub.get('translation', '') or sub['text']
-                    elif item == "双语 (译文在上)": trans = sub.get('translation', ''); orig = sub['text']; text_to_write = f"{trans}\n{orig}" if trans else orig
-                    f.write(f"{sub['index']}\n{sub['start_time']} --> {sub['end_time']}\n{text_to_write.strip()}\n\n")
+            mode = {"仅原文": "original", "仅译文": "translation", "双语 (译文在上)": "bilingual"}[item]
+            with open(save_path, 'w', encoding='utf-8') as f: f.write(compose_srt(self.subtitles, mode))
             self.status_bar.showMessage(f"已保存到: {save_path}")
         except Exception as e: QMessageBox.critical(self, "错误", f"保存失败: {e}")
     def update_srt_cache(self):
         if not self.media_path or not self.subtitles: QMessageBox.warning(self, "警告", "没有可更新的媒体或字幕。"); return
         cache_path = config.CACHE_DIR / (self.media_path.stem + ".srt")
         try:
-            with open(cache_path, 'w', encoding='utf-8') as f:
-                for sub in self.subtitles:
-                    trans = sub.get('translation', ''); orig = sub['text']; text_to_write = f"{trans}\n{orig}" if trans and orig else orig
-                    f.write(f"{sub['index']}\n{sub['start_time']} --> {sub['end_time']}\n{text_to_write.strip()}\n\n")
+            with open(cache_path, 'w', encoding='utf-8') as f: f.write(compose_srt(self.subtitles, "bilingual"))
             self.status_bar.showMessage(f"字幕缓存已更新: {cache_path.name}", 5000)
         except Exception as e: QMessageBox.critical(self, "错误", f"更新缓存失败: {e}")
     def on_audio_loaded(self, result):
         if self.progress_dialog: self.progress_dialog.close(); self.progress_dialog = None
-        if result: duration, waveform_data = result; self.media_duration_ms = int(duration * 1000); self.progress_slider.setMaximum(self.media_duration_ms); self.animation_timer.setInterval(16); self.animation_timer.timeout.connect(self.animate_playhead); event_manager = self.player.event_manager(); event_manager.event_attach(vlc.EventType.MediaPlayerPositionChanged, self.handle_vlc_position_change); self.audio_canvas.plot_data(duration, waveform_data); self.status_bar.showMessage("音频加载完成", 5000); self.audio_canvas.update_all_regions(self.subtitles)
+        if result: duration, waveform_data = result; self.media_duration_ms = int(duration * 1000); self.progress_slider.setMaximum(self.media_duration_ms); self.animation_timer.setInterval(16); self.animation_timer.timeout.connect(self.animate_playhead); event_manager = self.player.event_manager(); event_manager.event_attach(vlc.EventType.MediaPlayerPositionChanged, self.handle_vlc_position_change); self.waveform_data = waveform_data; self.audio_canvas.plot_data(duration, waveform_data); self.status_bar.showMessage("音频加载完成", 5000); self.audio_canvas.update_all_regions(self.subtitles)
         else: self.status_bar.showMessage("音频处理失败！", 5000)
     def handle_vlc_position_change(self, event):
         if self.media_duration_ms > 0:
@@ -217,25 +238,54 @@ class MainWindow(QMainWindow):
     def _force_update_position(self, time_ms):
         self.last_known_vlc_time_ms = time_ms; self.last_update_monotonic_time = time.monotonic(); seconds = time_ms / 1000.0; self.audio_canvas.update_playhead_position(seconds); self.progress_slider.blockSignals(True); self.progress_slider.setValue(int(time_ms)); self.progress_slider.blockSignals(False)
     def seek_video(self, value_ms):
-        if self.media_duration_ms > 0: self.player.set_position(value_ms / self.media_duration_ms); self._force_update_position(value_ms)
+        if self.media_duration_ms > 0:
+            if self.pending_seek_ms is not None: self.pending_seek_ms = value_ms # 切换代理后尚未播放，播放时再定位
+            else: self.player.set_position(value_ms / self.media_duration_ms)
+            self._force_update_position(value_ms)
     def update_playhead_from_slider(self, value_ms): self.audio_canvas.update_playhead_position(value_ms / 1000.0)
     def jump_to_timestamp(self, row, column):
-        if 0 <= row < len(self.subtitles): sub = self.subtitles[row]; self.audio_canvas.focus_on_region(row); start_ms = int(sub['start_sec'] * 1000); self.preview_end_time = sub['end_sec']; self.player.play(); self.player.set_time(start_ms); self._force_update_position(start_ms); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPause)); self.animation_timer.start()
+        if 0 <= row < len(self.subtitles): sub = self.subtitles[row]; self.audio_canvas.focus_on_region(row); start_ms = int(sub['start_sec'] * 1000); self.preview_end_time = sub['end_sec']; self.pending_seek_ms = None; self.player.play(); self.player.set_time(start_ms); self._force_update_position(start_ms); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPause)); self.animation_timer.start()
     def pause_after_preview(self, final_pos_sec):
         if self.player.is_playing(): self.player.pause(); self.animation_timer.stop(); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPlay))
         self._force_update_position(final_pos_sec * 1000); self.preview_end_time = None
     def toggle_play_pause(self):
         self.preview_end_time = None
         if self.player.is_playing(): self.player.pause(); self.animation_timer.stop(); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPlay)); self._force_update_position(self.player.get_time())
-        else: self.player.play(); self.animation_timer.start(); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPause))
-    def stop_video(self): self.preview_end_time = None; self.player.stop(); self.animation_timer.stop(); self._force_update_position(0); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaStop))
-    def load_media(self):
-        if self.media_path: media = self.vlc_instance.media_new(str(self.media_path)); self.player.set_media(media)
+        else:
+            self.player.play(); self.animation_timer.start(); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaPause))
+            if self.pending_seek_ms is not None: self.player.set_time(int(self.pending_seek_ms)); self._force_update_position(self.pending_seek_ms); self.pending_seek_ms = None
+    def stop_video(self): self.preview_end_time = None; self.pending_seek_ms = None; self.player.stop(); self.animation_timer.stop(); self._force_update_position(0); self.play_pause_btn.setIcon(self.style().standardIcon(QStyle.StandardPixmap.SP_MediaStop))
+    def load_media(self, playback_path=None):
+        playback_path = playback_path or self.media_path; self.pending_seek_ms = None
+        if playback_path: media = self.vlc_instance.media_new(str(playback_path)); self.player.set_media(media)
+
+    # --- 代理媒体 (仅用于播放和定位，转写/重新识别仍读取原始文件) ---
+    def get_proxy_path(self): return config.CACHE_DIR / (self.media_path.stem + ".proxy.mp4")
+    def start_proxy_generation(self):
+        if self.proxy_worker and self.proxy_worker.isRunning(): self.proxy_worker.stop(); self.proxy_worker.wait(2000)
+        self.proxy_worker = None
+        if not self.media_path or not config.SETTINGS.get("use_proxy_media", True): return
+        proxy_path = self.get_proxy_path()
+        if is_proxy_current(self.media_path, proxy_path): self.switch_to_proxy(str(proxy_path)); return
+        self.proxy_worker = ProxyWorker(self.media_path, proxy_path, config.SETTINGS.get("proxy_height", 360), self); self.proxy_worker.finished.connect(self.on_proxy_ready); self.proxy_worker.error.connect(self.on_proxy_error); self.proxy_worker.start()
+    def on_proxy_ready(self, proxy_path):
+        self.proxy_worker = None
+        if proxy_path and self.media_path and Path(proxy_path) == self.get_proxy_path(): self.switch_to_proxy(proxy_path)
+    def on_proxy_error(self, error_msg):
+        self.proxy_worker = None; self.status_bar.showMessage(f"{error_msg}，将继续使用原始文件播放", 8000)
+    def switch_to_proxy(self, proxy_path):
+        was_playing = self.player.is_playing(); time_ms = self.player.get_time(); self.load_media(proxy_path)
+        if time_ms > 0:
+            # set_media 会把 VLC 重置到 0；暂停状态下先记住位置，下次播放时再定位
+            if was_playing: self.player.play(); self.player.set_time(time_ms)
+            else: self.pending_seek_ms = time_ms
+            self._force_update_position(time_ms)
+        self.status_bar.showMessage(f"已切换到代理媒体: {Path(proxy_path).name}", 5000)
     def closeEvent(self, event):
         self.setWindowTitle("正在关闭，请稍候...")
         QApplication.processEvents()
         self.animation_timer.stop()
-        workers_to_stop = [self.audio_worker, self.transcription_worker, self.retranscribe_worker, self.translation_worker]
+        workers_to_stop = [self.audio_worker, self.proxy_worker, self.transcription_worker, self.retranscribe_worker, self.translation_worker, self.calibration_worker, self.resync_worker]
         for worker in workers_to_stop:
             if worker and worker.isRunning():
                 worker.stop()
@@ -255,10 +305,15 @@ class MainWindow(QMainWindow):
     def start_transcription(self):
         if not self.media_path: QMessageBox.warning(self, "警告", "请先打开文件！"); return
         if not self.model_combo.currentText() or "目录为空" in self.model_combo.currentText(): QMessageBox.warning(self, "警告", "请选择模型！"); return
-        self.subtitles.clear(); self.subtitle_table.setRowCount(0); self.transcribe_btn.setEnabled(False); self.open_btn.setEnabled(False); self.status_bar.showMessage("转写中..."); model_path = str(config.MODELS_DIR / self.model_combo.currentText()); device = self.device_combo.currentText(); whisper_params = {k: v for k, v in config.SETTINGS.items() if k in ["beam_size", "vad_min_silence_ms", "language", "word_timestamps", "initial_prompt"]}; self.transcription_worker = TranscriptionWorker(self.media_path, model_path, device, whisper_params, self); self.transcription_worker.segment_ready.connect(self.add_subtitle_segment); self.transcription_worker.finished.connect(self.on_transcription_finished); self.transcription_worker.error.connect(self.show_critical_error); self.transcription_worker.start()
+        resume = False; checkpoint = load_transcription_checkpoint(self.media_path)
+        if checkpoint:
+            reply = QMessageBox.question(self, "继续转写", f"检测到未完成的转写（已完成 {checkpoint['segment_count']} 条，至 {format_time(checkpoint['last_end_sec'])}）。\n是否从断点继续？选择“否”将从头开始。", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel, QMessageBox.StandardButton.Yes)
+            if reply == QMessageBox.StandardButton.Cancel: return
+            resume = reply == QMessageBox.StandardButton.Yes
+        self.subtitles.clear(); self.subtitle_table.setRowCount(0); self.audio_canvas.update_all_regions([]); self.transcribe_btn.setEnabled(False); self.open_btn.setEnabled(False); self.status_bar.showMessage("从断点继续转写..." if resume else "转写中..."); model_path = str(config.MODELS_DIR / self.model_combo.currentText()); device = self.device_combo.currentText(); whisper_params = {k: v for k, v in config.SETTINGS.items() if k in ["beam_size", "vad_min_silence_ms", "language", "word_timestamps", "initial_prompt"]}; self.transcription_worker = TranscriptionWorker(self.media_path, model_path, device, whisper_params, resume, self); self.transcription_worker.segment_ready.connect(self.segment_batcher.add, Qt.ConnectionType.DirectConnection); self.transcription_worker.finished.connect(self.on_transcription_finished); self.transcription_worker.error.connect(self.show_critical_error); self.transcription_worker.start()
     
     def on_transcription_finished(self, srt_path): 
-        self.srt_path = srt_path; self.transcribe_btn.setEnabled(True); self.open_btn.setEnabled(True); self.status_bar.showMessage(f"转写完成！", 10000); QMessageBox.information(self, "成功", f"转写完成！\n字幕已存至: {srt_path}"); self.audio_canvas.update_all_regions(self.subtitles)
+        self.segment_batcher.flush(); self.srt_path = srt_path; self.transcribe_btn.setEnabled(True); self.open_btn.setEnabled(True); self.status_bar.showMessage(f"转写完成！", 10000); QMessageBox.information(self, "成功", f"转写完成！\n字幕已存至: {srt_path}")
         self.transcription_worker = None # 任务完成后，释放对worker的引用
 
     def on_retranscription_finished(self, new_text, row_index):
@@ -282,14 +337,46 @@ class MainWindow(QMainWindow):
         if not model_folder_name or "目录为空" in model_folder_name: QMessageBox.warning(self, "警告", "请选择有效的模型！"); return
         self.load_model_btn.setEnabled(False); self.unload_model_btn.setEnabled(False)
         self.status_bar.showMessage("正在加载模型..."); QApplication.processEvents()
-        model_path = str(config.MODELS_DIR / model_folder_name); device = self.device_combo.currentText(); compute_type = "float16" if device == "cuda" else "int8"
+        model_path = str(config.MODELS_DIR / model_folder_name); device = self.device_combo.currentText()
         try: 
-            self.model = WhisperModel(model_path, device=device, compute_type=compute_type)
+            self.model = WhisperModel(model_path, device=device, **get_model_options(model_path, device))
             self.status_bar.showMessage("模型加载成功！", 5000)
             self.unload_model_btn.setEnabled(True)
         except Exception as e: 
             QMessageBox.critical(self, "错误", f"加载模型失败: {e}"); self.model = None
             self.load_model_btn.setEnabled(True)
+    def apply_calibrated_defaults(self):
+        calibration = config.load_calibration(self.model_combo.currentText())
+        self.device_combo.setCurrentText(calibration['device'] if calibration else ("cuda" if has_cuda() else "cpu"))
+    def start_calibration(self):
+        model_folder_name = self.model_combo.currentText()
+        if not model_folder_name or "目录为空" in model_folder_name: QMessageBox.warning(self, "警告", "请选择有效的模型！"); return
+        if self.calibration_worker and self.calibration_worker.isRunning(): return
+        reply = QMessageBox.question(self, "自动校准", f"将使用一段合成音频，在本机依次测试模型 '{model_folder_name}' 的多种设备/精度/线程数组合，可能需要数分钟。是否继续？")
+        if reply != QMessageBox.StandardButton.Yes: return
+        self.calibrate_btn.setEnabled(False)
+        self.progress_dialog = QProgressDialog("正在准备校准...", "取消", 0, 0, self); self.progress_dialog.setWindowModality(Qt.WindowModality.WindowModal); self.progress_dialog.setWindowTitle("自动校准"); self.progress_dialog.canceled.connect(self.cancel_calibration); self.progress_dialog.show()
+        self.calibration_worker = CalibrationWorker(str(config.MODELS_DIR / model_folder_name), config.SETTINGS.get("beam_size", 5), parent=self); self.calibration_worker.progress.connect(self.on_calibration_progress); self.calibration_worker.finished.connect(self.on_calibration_finished); self.calibration_worker.canceled.connect(self.on_calibration_canceled); self.calibration_worker.error.connect(self.on_calibration_error); self.calibration_worker.start()
+    def on_calibration_progress(self, message):
+        if self.progress_dialog: self.progress_dialog.setLabelText(f"正在测试 {message}")
+    def on_calibration_finished(self, result):
+        # 先释放 worker 再关闭对话框：QProgressDialog 关闭时会发出 canceled
+        self.calibration_worker = None; self.calibrate_btn.setEnabled(True)
+        if self.progress_dialog: self.progress_dialog.close(); self.progress_dialog = None
+        try: config.save_calibration(result['model'], result)
+        except Exception as e: QMessageBox.critical(self, "错误", f"保存校准结果失败: {e}"); return
+        if self.model_combo.currentText() == result['model']: self.apply_calibrated_defaults()
+        lines = [f"{d}: {r['compute_type']}" + (f", {r['cpu_threads']} 线程" if r.get('cpu_threads') else "") + f", 实时率 {r['rtf']:.3f}" + (f", 内存 {r['memory_mb']} MB" if r.get('memory_mb') is not None else "") for d, r in result['per_device'].items()]
+        QMessageBox.information(self, "校准完成", f"模型 '{result['model']}' 的最佳配置为 {result['device']} / {result['compute_type']}，之后将默认使用。\n\n" + "\n".join(lines) + "\n\n(实时率 = 处理耗时 / 音频时长，越小越快；内存为 cpu 的峰值内存增量或 cuda 的显存增量；重新加载模型后生效)")
+    def on_calibration_error(self, error_msg):
+        self.calibration_worker = None; self.calibrate_btn.setEnabled(True)
+        if self.progress_dialog: self.progress_dialog.close(); self.progress_dialog = None
+        QMessageBox.critical(self, "错误", error_msg)
+    def cancel_calibration(self):
+        # 按钮保持禁用，直到测试子进程被结束、worker 真正退出 (on_calibration_canceled)
+        if self.calibration_worker: self.calibration_worker.stop(); self.status_bar.showMessage("正在取消校准...")
+    def on_calibration_canceled(self):
+        self.calibration_worker = None; self.calibrate_btn.setEnabled(True); self.progress_dialog = None; self.status_bar.showMessage("校准已取消", 5000)
     def unload_whisper_model(self):
         if self.model:
             self.load_model_btn.setEnabled(False); self.unload_model_btn.setEnabled(False)
@@ -308,9 +395,10 @@ class MainWindow(QMainWindow):
         sub = self.subtitles[row_index]; start = start_sec if start_sec is not None else sub['start_sec']; end = end_sec if end_sec is not None else sub['end_sec']; self.status_bar.showMessage(f"正在重新识别第 {sub['index']} 行...")
         whisper_params = {k: v for k, v in config.SETTINGS.items() if k in ["beam_size", "initial_prompt"]}; self.retranscribe_worker = RetranscribeWorker(self.media_path, self.model, start, end, row_index, whisper_params, self); self.retranscribe_worker.finished.connect(self.on_retranscription_finished); self.retranscribe_worker.error.connect(self.show_critical_error); self.retranscribe_worker.start()
     def set_icons(self):
-        style = self.style(); self.open_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DirOpenIcon)); self.import_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_FileLinkIcon)); self.play_pause_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_MediaPlay)); self.stop_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_MediaStop)); self.save_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DialogSaveButton)); self.transcribe_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_FileIcon)); self.refresh_models_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_BrowserReload)); self.load_model_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DialogApplyButton)); self.unload_model_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DialogCloseButton)); self.settings_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_FileDialogDetailedView)); self.update_cache_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DriveHDIcon)); self.translate_all_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_CommandLink))
+        style = self.style(); self.open_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DirOpenIcon)); self.import_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_FileLinkIcon)); self.play_pause_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_MediaPlay)); self.stop_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_MediaStop)); self.save_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DialogSaveButton)); self.transcribe_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_FileIcon)); self.refresh_models_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_BrowserReload)); self.load_model_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DialogApplyButton)); self.unload_model_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DialogCloseButton)); self.settings_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_FileDialogDetailedView)); self.update_cache_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_DriveHDIcon)); self.translate_all_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_CommandLink)); self.calibrate_btn.setIcon(style.standardIcon(QStyle.StandardPixmap.SP_ComputerIcon))
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # 打包后校准的子进程需要
     app = QApplication(sys.argv)
     config.setup_environment()
     if not Path(config.FFMPEG_PATH).is_file(): QMessageBox.critical(None, "依赖缺失", f"错误：找不到 ffmpeg.exe！\n请在'设置'中配置正确路径: {config.FFMPEG_PATH}")
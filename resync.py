@@ -0,0 +1,97 @@
+# resync.py
+# 将已有字幕整体重新对齐到另一版剪辑/帧率的媒体：
+# 用 FFT 互相关比较「语音活动包络」和「字幕时间轴」，估计整体偏移、线性漂移和分段偏移
+
+import numpy as np
+
+# 常见的帧率换算比例 (新时间 = 旧时间 * scale)，例如 23.976 -> 25 的 PAL 加速
+FRAME_RATE_SCALES = (1.0, 24000 / 1001 / 25, 25 / (24000 / 1001), 24000 / 1001 / 24, 24 / (24000 / 1001), 24 / 25, 25 / 24, 30000 / 1001 / 30, 30 / (30000 / 1001))
+
+def speech_activity(rms_vals, eps=1e-6):
+    """由 AudioWorker 的 RMS 包络估计 0~1 的语音活动度（对数能量按分位数归一化）"""
+    log_energy = np.log10(np.asarray(rms_vals, dtype=np.float64) + eps)
+    low, high = np.percentile(log_energy, [20, 95])
+    return np.clip((log_energy - low) / max(high - low, 1e-3), 0.0, 1.0).astype(np.float32)
+
+def cue_activity(starts, ends, hop, length):
+    """将字幕区间栅格化为与包络同帧率的 0/1 序列；starts/ends 可以是 (S, N) 的批量数组"""
+    starts = np.atleast_2d(starts); ends = np.atleast_2d(ends); rows = np.arange(starts.shape[0])[:, None]
+    diff = np.zeros((starts.shape[0], length + 1), dtype=np.int32)
+    np.add.at(diff, (np.broadcast_to(rows, starts.shape), np.clip(np.round(starts / hop).astype(np.int64), 0, length)), 1)
+    np.add.at(diff, (np.broadcast_to(rows, ends.shape), np.clip(np.round(ends / hop).astype(np.int64), 0, length)), -1)
+    return (np.cumsum(diff, axis=1)[:, :length] > 0).astype(np.float32)
+
+def xcorr_peaks(refs, templates, max_lag):
+    """批量 FFT 互相关，返回每行的最佳滞后(帧, 抛物线插值到亚帧)和归一化峰值。
+    滞后 k 表示 templates 向后平移 k 帧后与 refs 最吻合；refs 为 (N,) 时对所有 templates 共用"""
+    refs = np.atleast_2d(refs).astype(np.float32); templates = np.atleast_2d(templates).astype(np.float32)
+    refs = refs - refs.mean(axis=1, keepdims=True); templates = templates - templates.mean(axis=1, keepdims=True)
+    n = 1 << int(np.ceil(np.log2(refs.shape[1] + templates.shape[1])))
+    corr = np.fft.irfft(np.fft.rfft(refs, n, axis=1) * np.conj(np.fft.rfft(templates, n, axis=1)), n, axis=1)
+    max_lag = int(min(max_lag, n // 2 - 2)); lags = np.arange(-max_lag, max_lag + 1)
+    window = corr[:, lags % n]; best = window.argmax(axis=1); rows = np.arange(window.shape[0])
+    y0 = window[rows, best]; ym = corr[rows, (lags[best] - 1) % n]; yp = corr[rows, (lags[best] + 1) % n]
+    denom = ym - 2 * y0 + yp
+    frac = np.where(np.abs(denom) > 1e-12, 0.5 * (ym - yp) / np.where(denom == 0, 1, denom), 0.0)
+    norm = np.linalg.norm(refs, axis=1) * np.linalg.norm(templates, axis=1)
+    return lags[best] + np.clip(frac, -0.5, 0.5), np.where(norm > 0, y0 / np.where(norm == 0, 1, norm), 0.0)
+
+def estimate_resync(time_axis, rms_vals, starts, ends, max_offset=600.0, scales=FRAME_RATE_SCALES, window_sec=240.0, search_sec=8.0, jump_sec=0.3, min_confidence=0.1):
+    """估计字幕到新媒体的映射，返回包含 scale/offset/drift/segments 及新起止时间数组的字典。
+    1) 对所有候选帧率比例一次性做全局互相关，得到比例和整体偏移，峰值相关度低于 min_confidence 时抛出 ValueError；
+    2) 按窗口做局部互相关，得到残余偏移；相邻窗口偏移跳变超过 jump_sec 时分段，切点取逐条字幕与包络吻合度最高的位置；
+    3) 各分段共用一个线性漂移斜率，段内各自一个偏移"""
+    time_axis = np.asarray(time_axis, dtype=np.float64); starts = np.asarray(starts, dtype=np.float64); ends = np.asarray(ends, dtype=np.float64)
+    if len(time_axis) < 2 or len(starts) < 5: raise ValueError("音频包络或字幕数量不足，无法对齐")
+    hop = float(time_axis[1] - time_axis[0]); env = speech_activity(rms_vals); length = len(env)
+    # 1) 全局：比例 + 偏移
+    scales = np.asarray(scales, dtype=np.float64)
+    template_len = max(length, int(np.ceil(ends.max() * scales.max() / hop)) + 1)
+    lags, peaks = xcorr_peaks(env, cue_activity(np.outer(scales, starts), np.outer(scales, ends), hop, template_len), max_offset / hop)
+    best = int(np.argmax(peaks))
+    if peaks[best] < peaks[0] * 1.02: best = 0 # 比例为 1 时只要相差不大就优先保留
+    scale = float(scales[best]); offset = float(lags[best] * hop); confidence = float(peaks[best])
+    # 没有语音(静音包络)或媒体与字幕并非同一内容时峰值接近 0，此时的偏移只是搜索范围的边界，不能使用
+    if confidence < min_confidence: raise ValueError(f"语音包络与字幕的相关度过低 ({confidence:.2f})，无法可靠对齐，请确认媒体包含对白且与字幕对应")
+    g_starts = starts * scale + offset; g_ends = ends * scale + offset; mids = (g_starts + g_ends) / 2
+    # 2) 局部：按窗口批量互相关
+    win = int(window_sec / hop); search = int(search_sec / hop); step = max(win // 2, 1)
+    win_starts = np.arange(0, max(length - win, 0) + 1, step)
+    refs = np.zeros((len(win_starts), win + 2 * search), dtype=np.float32); padded = np.concatenate([np.zeros(search, np.float32), env, np.zeros(win + search, np.float32)])
+    for i, w0 in enumerate(win_starts): refs[i] = padded[w0:w0 + win + 2 * search]
+    w0_sec = win_starts * hop; in_win = (mids[None, :] >= w0_sec[:, None]) & (mids[None, :] < w0_sec[:, None] + win * hop)
+    rel = (w0_sec - search * hop)[:, None]
+    templates = cue_activity(np.where(in_win, g_starts[None, :] - rel, -1.0), np.where(in_win, g_ends[None, :] - rel, -1.0), hop, win + 2 * search)
+    local_lags, local_peaks = xcorr_peaks(refs, templates, search)
+    valid = (in_win.sum(axis=1) >= 3) & (local_peaks >= min_confidence)
+    centers = w0_sec[valid] + win * hop / 2; local_offsets = local_lags[valid] * hop; weights = local_peaks[valid]
+    segments = []; drift = 0.0
+    if len(centers):
+        # 3) 中值滤波后按跳变分段，段内去均值后合并估计一个共同的漂移斜率
+        smoothed = np.array([np.median(local_offsets[max(0, i - 1):i + 2]) for i in range(len(local_offsets))])
+        run_ids = np.concatenate([[0], np.cumsum(np.abs(np.diff(smoothed)) > jump_sec)])
+        t_dev = np.zeros_like(centers); d_dev = np.zeros_like(centers); run_means = []
+        for r in range(run_ids[-1] + 1):
+            m = run_ids == r; t_mean = np.average(centers[m], weights=weights[m]); d_mean = np.average(smoothed[m], weights=weights[m])
+            t_dev[m] = centers[m] - t_mean; d_dev[m] = smoothed[m] - d_mean; run_means.append((t_mean, d_mean))
+        if np.sum(weights * t_dev ** 2) > 0: drift = float(np.sum(weights * t_dev * d_dev) / np.sum(weights * t_dev ** 2))
+        # 分段边界：对两段窗口之间的字幕分别按前后两段的偏移计算与语音包络的吻合度，取总吻合度最高的切分点
+        env_cumsum = np.concatenate([[0.0], np.cumsum(env, dtype=np.float64)])
+        def coverage(a, b):
+            i = np.clip(np.round(a / hop).astype(np.int64), 0, length); j = np.clip(np.round(b / hop).astype(np.int64), 0, length)
+            return (env_cumsum[np.maximum(j, i + 1).clip(max=length)] - env_cumsum[i]) / np.maximum(j - i, 1)
+        boundaries = [-np.inf]
+        for r in range(1, run_ids[-1] + 1):
+            # 跨越切点的窗口可能被归入任一段，因此向两侧各放宽半个窗口
+            lo = centers[run_ids == r - 1].max() - win * hop / 2; hi = centers[run_ids == r].min() + win * hop / 2; idx = np.where((mids >= lo) & (mids < hi))[0]
+            if not len(idx): boundaries.append(float((lo + hi) / 2)); continue
+            fit = lambda t_mean, d_mean: coverage(g_starts[idx] + d_mean + drift * (g_starts[idx] - t_mean), g_ends[idx] + d_mean + drift * (g_ends[idx] - t_mean))
+            left = fit(*run_means[r - 1]); right = fit(*run_means[r])
+            split = int(np.argmax(np.concatenate([[0.0], np.cumsum(left)]) + np.concatenate([np.cumsum(right[::-1])[::-1], [0.0]])))
+            boundaries.append(float(mids[idx[split]]) if split < len(idx) else float(hi))
+        for (t_mean, d_mean), b in zip(run_means, boundaries): segments.append({'start': b, 'offset': d_mean - drift * t_mean})
+    # 应用：新时间 = 全局变换 + 分段偏移 + 漂移
+    seg_starts = np.array([s['start'] for s in segments]) if segments else np.array([-np.inf]); seg_offsets = np.array([s['offset'] for s in segments]) if segments else np.array([0.0])
+    seg_idx = np.searchsorted(seg_starts, mids, side='right') - 1
+    new_starts = np.maximum(g_starts * (1 + drift) + seg_offsets[seg_idx], 0.0); new_ends = np.maximum(g_ends * (1 + drift) + seg_offsets[seg_idx], new_starts)
+    return {'scale': scale, 'offset': offset, 'drift': drift, 'confidence': confidence, 'segments': [{'start': max(s['start'], 0.0), 'offset': s['offset']} for s in segments], 'starts': new_starts, 'ends': new_ends}
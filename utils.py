@@ -18,4 +18,27 @@ def parse_time(time_str: str) -> float:
         parts = re.split('[:,]', time_str)
         return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2]) + int(parts[3]) / 1000.0
     except (ValueError, IndexError):
-        return 0.0
\ No newline at end of file
+        return 0.0
+
+SRT_BLOCK_PATTERN = re.compile(r'(\d+)\n(\d{2}:\d{2}:\d{2},\d{3}) --> (\d{2}:\d{2}:\d{2},\d{3})\n(.*?)\n\n', re.DOTALL)
+
+def parse_srt(content: str) -> list:
+    """将 SRT 文本解析为字幕字典列表（双语块中第一行视为译文）"""
+    subtitles = []
+    for match in SRT_BLOCK_PATTERN.finditer(content):
+        text_block = match.group(4).strip().split('\n'); original_text = ''; translation = ''
+        if len(text_block) > 1 and text_block[0] and text_block[1]: translation = text_block[0]; original_text = '\n'.join(text_block[1:])
+        else: original_text = '\n'.join(text_block)
+        subtitles.append({'index': int(match.group(1)), 'start_time': match.group(2), 'end_time': match.group(3), 'start_sec': parse_time(match.group(2)), 'end_sec': parse_time(match.group(3)), 'text': original_text, 'translation': translation})
+    return subtitles
+
+def compose_srt(subtitles: list, mode: str = "bilingual") -> str:
+    """将字幕字典列表序列化为 SRT 文本，mode 可选 original / translation / bilingual(译文在上)"""
+    blocks = []
+    for sub in subtitles:
+        orig = sub['text']; trans = sub.get('translation', '')
+        if mode == "original": text_to_write = orig
+        elif mode == "translation": text_to_write = trans or orig
+        else: text_to_write = f"{trans}\n{orig}" if trans else orig
+        blocks.append(f"{sub['index']}\n{sub['start_time']} --> {sub['end_time']}\n{text_to_write.strip()}\n\n")
+    return "".join(blocks)
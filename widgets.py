@@ -1,12 +1,13 @@
 # widgets.py
 # 包含自定义的 PyQt6 控件
 
+import threading
 import numpy as np
 import pyqtgraph as pg
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, QFormLayout, QFileDialog,
                              QTextEdit, QDialogButtonBox, QLabel, QPushButton, QMessageBox, QSpinBox, 
                              QWidget, QCheckBox, QComboBox, QInputDialog, QTabWidget)
-from PyQt6.QtCore import pyqtSignal, QThread
+from PyQt6.QtCore import pyqtSignal, QThread, QObject, QTimer
 
 try: import openai
 except ImportError: openai = None
@@ -26,12 +27,31 @@ class ModelListWorker(QThread):
             model_ids = sorted([model.id for model in models.data]); self.finished.emit(model_ids)
         except Exception as e: self.error.emit(f"获取模型列表失败: {e}")
 
+# 合并后台线程的逐条结果，每帧(默认 16ms)最多向界面发出一次 flushed(list)；
+# add 可在工作线程中直接调用(DirectConnection)，每次刷新只产生一次跨线程事件
+class UpdateBatcher(QObject):
+    flushed = pyqtSignal(list)
+    _schedule = pyqtSignal()
+    def __init__(self, interval_ms=16, parent=None):
+        super().__init__(parent); self.lock = threading.Lock(); self.pending = []; self.scheduled = False
+        self.timer = QTimer(self); self.timer.setSingleShot(True); self.timer.setInterval(interval_ms); self.timer.timeout.connect(self.flush); self._schedule.connect(self.timer.start)
+    def add(self, *item):
+        with self.lock:
+            self.pending.append(item if len(item) > 1 else item[0])
+            if self.scheduled: return
+            self.scheduled = True
+        self._schedule.emit()
+    def flush(self):
+        with self.lock: items, self.pending, self.scheduled = self.pending, [], False
+        if items: self.flushed.emit(items)
+
 class SettingsDialog(QDialog):
     def __init__(self, current_settings, parent=None):
         super().__init__(parent); self.setWindowTitle("设置"); self.setMinimumWidth(600); self.settings = current_settings.copy(); self.layout = QVBoxLayout(self); form_layout = QFormLayout()
         form_layout.addRow(QLabel("<b>--- 路径设置 ---</b>"))
         self.vlc_path_edit = QLineEdit(self.settings.get("vlc_path", "")); self.ffmpeg_path_edit = QLineEdit(self.settings.get("ffmpeg_path", "")); self.models_dir_edit = QLineEdit(self.settings.get("models_dir", ""))
         form_layout.addRow("VLC 路径:", self.create_path_widget(self.vlc_path_edit, is_dir=True)); form_layout.addRow("FFmpeg 路径:", self.create_path_widget(self.ffmpeg_path_edit, is_file=True)); form_layout.addRow("模型目录:", self.create_path_widget(self.models_dir_edit, is_dir=True))
+        self.use_proxy_check = QCheckBox(); self.use_proxy_check.setChecked(self.settings.get("use_proxy_media", True)); self.use_proxy_check.setToolTip("打开视频后在后台生成低分辨率的代理文件(存于缓存目录)，\n生成完成后播放和拖动定位将自动切换到代理，适合高码率/4K 素材。"); form_layout.addRow("使用代理媒体播放:", self.use_proxy_check)
         form_layout.addRow(QLabel("<b>--- Whisper 转写参数 ---</b>"))
         self.language_combo = QComboBox(); self.language_combo.setToolTip("选择音频的语言。'自动检测'能识别语言，但指定语言可以提高准确性。")
         for code, name in LANGUAGES.items(): self.language_combo.addItem(f"{name} ({code})", code)
@@ -115,7 +135,7 @@ class SettingsDialog(QDialog):
 
     def get_settings(self):
         self.settings.update({
-            "vlc_path": self.vlc_path_edit.text(), "ffmpeg_path": self.ffmpeg_path_edit.text(), "models_dir": self.models_dir_edit.text(),
+            "vlc_path": self.vlc_path_edit.text(), "ffmpeg_path": self.ffmpeg_path_edit.text(), "models_dir": self.models_dir_edit.text(), "use_proxy_media": self.use_proxy_check.isChecked(),
             "beam_size": self.beam_size_spin.value(), "vad_min_silence_ms": self.vad_min_silence_spin.value(), "language": self.language_combo.currentData(),
             "word_timestamps": self.word_ts_check.isChecked(), "initial_prompt": self.initial_prompt_edit.text(),
             "openai_api_base": self.api_base_edit.text(), "openai_api_key": self.api_key_edit.text(), "openai_model": self.model_combo.currentText(),
@@ -162,8 +182,9 @@ class AudioVisualizer(pg.PlotWidget):
         y_limit = 10 ** ((50 - self.slider_value) / 50.0); self.setYRange(-y_limit, y_limit, padding=0.05)
     def update_all_regions(self, subtitles):
         for region in self.regions: self.removeItem(region)
-        self.regions.clear()
-        for i, sub in enumerate(subtitles):
+        self.regions.clear(); self.add_regions(subtitles, 0)
+    def add_regions(self, subtitles, start_index):
+        for i, sub in enumerate(subtitles[start_index:], start_index):
             region = pg.LinearRegionItem(values=[sub['start_sec'], sub['end_sec']], orientation='vertical', brush=(255, 255, 255, 50), movable=True); region.row_index = i; region.sigRegionChangeFinished.connect(self.on_region_changed); self.addItem(region); self.regions.append(region)
     def on_region_changed(self, region):
         start_sec, end_sec = region.getRegion(); self.region_updated.emit(region.row_index, start_sec, end_sec)
@@ -1,17 +1,37 @@
 # workers.py
 # 后台工作线程，处理耗时任务
 
-import os, tempfile
+import os, sys, json, time, uuid, platform, tempfile, threading, subprocess, multiprocessing
+from datetime import datetime
 from pathlib import Path
 import re
 try: import torch
 except ImportError: torch = None
+try: import resource
+except ImportError: resource = None # Windows 没有 resource 模块，改用 psutil
+try: import psutil
+except ImportError: psutil = None
 import numpy as np
+import ctranslate2
 from faster_whisper import WhisperModel
+from faster_whisper.tokenizer import Tokenizer
 from PyQt6.QtCore import QThread, pyqtSignal
 import ffmpeg, openai
 
-from utils import format_time
+import config
+from utils import format_time, parse_srt, compose_srt
+from resync import estimate_resync
+
+def compute_waveform_envelope(waveform, chunk_size=1024, sample_rate=16000):
+    """将 PCM 采样按块归约为 (时间轴, 最小值, 最大值, RMS)，用于波形绘制"""
+    num_chunks = len(waveform) // chunk_size
+    if num_chunks == 0: return (np.array([]), np.array([]), np.array([]), np.array([]))
+    waveform = waveform[:num_chunks * chunk_size].reshape((num_chunks, chunk_size))
+    time_axis = np.arange(num_chunks) * (chunk_size / float(sample_rate))
+    min_vals = waveform.min(axis=1)
+    max_vals = waveform.max(axis=1)
+    rms_vals = np.sqrt(np.mean(waveform**2, axis=1))
+    return (time_axis, min_vals, max_vals, rms_vals)
 
 class AudioWorker(QThread):
     finished = pyqtSignal(object)
@@ -25,51 +45,145 @@ class AudioWorker(QThread):
             duration = float(probe['format']['duration'])
             
             waveform = np.frombuffer(out, dtype=np.float32)
-            chunk_size = 1024
-            num_chunks = len(waveform) // chunk_size
-            
-            if num_chunks > 0:
-                waveform = waveform[:num_chunks * chunk_size]
-                waveform = waveform.reshape((num_chunks, chunk_size))
-                time_axis = np.arange(num_chunks) * (chunk_size / 16000.0)
-                min_vals = waveform.min(axis=1)
-                max_vals = waveform.max(axis=1)
-                rms_vals = np.sqrt(np.mean(waveform**2, axis=1))
-                processed_data = (time_axis, min_vals, max_vals, rms_vals)
-                self.finished.emit((duration, processed_data))
-            else:
-                empty_data = (np.array([]), np.array([]), np.array([]), np.array([]))
-                self.finished.emit((duration, empty_data))
+            self.finished.emit((duration, compute_waveform_envelope(waveform)))
         except Exception as e: self.error.emit(f"FFmpeg处理音频失败: {e}")
 
+def get_proxy_info_path(proxy_path):
+    return Path(proxy_path).with_suffix(".json")
+
+def is_proxy_current(media_path, proxy_path):
+    """代理存在且记录的源文件大小/修改时间与当前媒体一致时才可复用（同名的不同版本不会误用）"""
+    info_path = get_proxy_info_path(proxy_path)
+    if not (Path(proxy_path).exists() and info_path.exists()): return False
+    try:
+        with open(info_path, 'r', encoding='utf-8') as f: info = json.load(f)
+        stat = Path(media_path).stat()
+        return info.get('media_size') == stat.st_size and info.get('media_mtime') == stat.st_mtime
+    except (OSError, json.JSONDecodeError): return False
+
+class ProxyWorker(QThread):
+    finished = pyqtSignal(str)
+    error = pyqtSignal(str)
+    def __init__(self, media_path, proxy_path, height=360, parent=None):
+        super().__init__(parent)
+        self.media_path = str(media_path); self.proxy_path = Path(proxy_path); self.height = height; self.process = None; self._is_running = True; self.lock = threading.Lock()
+    def run(self):
+        # 先写入临时文件，完成后再重命名，避免中断的半成品被当作缓存复用；每次运行使用独立的临时文件名，
+        # 同一文件被重新打开时，尚未退出的旧 worker 不会删掉新 worker 正在写入的文件
+        tmp_path = self.proxy_path.with_name(f"{self.proxy_path.stem}.{uuid.uuid4().hex[:8]}.part{self.proxy_path.suffix}")
+        try:
+            probe = ffmpeg.probe(self.media_path); media_stat = Path(self.media_path).stat()
+            if not self._is_running: return
+            # 音频文件内嵌的封面 (attached_pic) 也是 video 流，不算真正的视频
+            if not any(s.get('codec_type') == 'video' and not s.get('disposition', {}).get('attached_pic') for s in probe.get('streams', [])):
+                self.finished.emit(""); return # 纯音频文件无需代理
+            self.proxy_path.parent.mkdir(parents=True, exist_ok=True)
+            # g=1 即全帧内编码：任意位置都能直接解码，配合低分辨率，VLC 软解下定位也很快
+            with self.lock: # 与 stop() 互斥：要么在启动前看到停止标志，要么 stop() 能拿到进程并结束它
+                if not self._is_running: return
+                process = self.process = (ffmpeg.input(self.media_path)
+                                          .output(str(tmp_path), vf=f"scale=-2:{self.height}", vcodec='libx264', preset='ultrafast', tune='fastdecode', crf=30, g=1, pix_fmt='yuv420p', acodec='aac', audio_bitrate='96k', ac=2, movflags='+faststart')
+                                          .run_async(cmd='ffmpeg', pipe_stderr=True, overwrite_output=True))
+            _, err = process.communicate()
+            if not self._is_running: return
+            if process.returncode != 0:
+                err_lines = err.decode('utf-8', errors='ignore').strip().splitlines()
+                raise RuntimeError(err_lines[-1] if err_lines else f"ffmpeg 退出码 {process.returncode}")
+            os.replace(tmp_path, self.proxy_path)
+            with open(get_proxy_info_path(self.proxy_path), 'w', encoding='utf-8') as f: json.dump({'media_path': self.media_path, 'media_size': media_stat.st_size, 'media_mtime': media_stat.st_mtime}, f)
+            self.finished.emit(str(self.proxy_path))
+        except Exception as e:
+            if self._is_running: self.error.emit(f"生成代理媒体失败: {e}")
+        finally:
+            with self.lock: self.process = None
+            try:
+                if tmp_path.exists(): tmp_path.unlink()
+            except OSError: pass
+    def stop(self):
+        with self.lock:
+            self._is_running = False
+            if self.process and self.process.poll() is None: self.process.kill()
+
+def has_cuda():
+    try: return ctranslate2.get_cuda_device_count() > 0
+    except Exception: return False
+
+def get_model_options(model_path, device):
+    """返回创建 WhisperModel 的 compute_type/cpu_threads，优先使用本机对该模型的校准结果"""
+    calibration = config.load_calibration(Path(model_path).name)
+    best = (calibration or {}).get('per_device', {}).get(device)
+    if best:
+        options = {'compute_type': best['compute_type']}
+        if best.get('cpu_threads'): options['cpu_threads'] = best['cpu_threads']
+        return options
+    return {'compute_type': "float16" if device == "cuda" else "int8"}
+
+def get_checkpoint_paths(media_path):
+    """返回 (进行中的 SRT, 断点 JSON) 路径，与字幕缓存一样以媒体文件名为键"""
+    stem = Path(media_path).stem
+    return config.CACHE_DIR / (stem + ".partial.srt"), config.CACHE_DIR / (stem + ".checkpoint.json")
+
+def load_transcription_checkpoint(media_path):
+    """读取与当前媒体匹配的转写断点，不存在或媒体文件已变化时返回 None"""
+    partial_path, checkpoint_path = get_checkpoint_paths(media_path)
+    if not (partial_path.exists() and checkpoint_path.exists()): return None
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f: checkpoint = json.load(f)
+        stat = Path(media_path).stat()
+        if checkpoint.get('media_size') != stat.st_size or checkpoint.get('media_mtime') != stat.st_mtime: return None
+        return checkpoint if checkpoint.get('segment_count', 0) > 0 else None
+    except (OSError, json.JSONDecodeError): return None
+
 class TranscriptionWorker(QThread):
     segment_ready = pyqtSignal(dict)
     finished = pyqtSignal(str)
     error = pyqtSignal(str)
-    def __init__(self, media_path, model_path, device, whisper_params, parent=None):
+    def __init__(self, media_path, model_path, device, whisper_params, resume=False, parent=None):
         super().__init__(parent)
-        self.media_path = media_path; self.model_path = model_path; self.device = device; self.whisper_params = whisper_params; self._is_running = True
+        self.media_path = media_path; self.model_path = model_path; self.device = device; self.whisper_params = whisper_params; self.resume = resume; self._is_running = True
     def run(self):
         model = None
         try:
-            compute_type = "float16" if self.device == "cuda" else "int8"
-            model = WhisperModel(self.model_path, device=self.device, compute_type=compute_type)
-            segments, info = model.transcribe(str(self.media_path), **self.whisper_params)
-            
-            srt_content = ""
-            for i, segment in enumerate(segments):
-                if not self._is_running: break
-                start_time_str = format_time(segment.start)
-                end_time_str = format_time(segment.end)
-                text = segment.text.strip()
-                self.segment_ready.emit({'index': i + 1, 'start_time': start_time_str, 'end_time': end_time_str, 'text': text, 'start_sec': segment.start, 'end_sec': segment.end})
-                srt_content += f"{i + 1}\n{start_time_str} --> {end_time_str}\n{text}\n\n"
-            
+            config.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            partial_path, checkpoint_path = get_checkpoint_paths(self.media_path)
+            checkpoint = load_transcription_checkpoint(self.media_path) if self.resume else None
+            done_segments = []
+            if checkpoint:
+                # 只信任断点 JSON 记录的条数，丢弃崩溃时可能多写入的半条
+                with open(partial_path, 'r', encoding='utf-8') as f: done_segments = parse_srt(f.read())[:checkpoint['segment_count']]
+                for seg_data in done_segments: self.segment_ready.emit(seg_data)
+            elif checkpoint_path.exists(): checkpoint_path.unlink()
+            offset = done_segments[-1]['end_sec'] if done_segments else 0.0
+            whisper_params = dict(self.whisper_params)
+            # 自动检测语言时，续转沿用首次检测到的语言，避免对剩余部分重新检测导致同一文件出现两种语言
+            if checkpoint and checkpoint.get('language') and whisper_params.get('language') in (None, "", "auto"): whisper_params['language'] = checkpoint['language']
+
+            model = WhisperModel(self.model_path, device=self.device, **get_model_options(self.model_path, self.device))
+            if offset > 0:
+                # 从断点处解码音频再送入模型，VAD 等参数保持不变，输出时间戳加上偏移量
+                out, _ = (ffmpeg.input(str(self.media_path), ss=offset).output('-', format='f32le', acodec='pcm_f32le', ac=1, ar=16000).run(cmd='ffmpeg', capture_stdout=True, capture_stderr=True))
+                segments, info = model.transcribe(np.frombuffer(out, dtype=np.float32), **whisper_params)
+            else:
+                segments, info = model.transcribe(str(self.media_path), **whisper_params)
+
+            media_stat = Path(self.media_path).stat()
+            with open(partial_path, "w", encoding="utf-8") as f:
+                f.write(compose_srt(done_segments, "original")); f.flush()
+                for segment in segments:
+                    if not self._is_running: break
+                    start_sec = segment.start + offset; end_sec = segment.end + offset; index = len(done_segments) + 1
+                    seg_data = {'index': index, 'start_time': format_time(start_sec), 'end_time': format_time(end_sec), 'text': segment.text.strip(), 'start_sec': start_sec, 'end_sec': end_sec}
+                    f.write(compose_srt([seg_data], "original")); f.flush()
+                    done_segments.append(seg_data)
+                    tmp_checkpoint = checkpoint_path.with_suffix(".tmp")
+                    with open(tmp_checkpoint, "w", encoding="utf-8") as cf: json.dump({'media_path': str(self.media_path), 'media_size': media_stat.st_size, 'media_mtime': media_stat.st_mtime, 'segment_count': index, 'last_end_sec': end_sec, 'language': info.language}, cf)
+                    os.replace(tmp_checkpoint, checkpoint_path)
+                    self.segment_ready.emit(seg_data)
+
             if self._is_running:
-                cache_dir = Path.home() / ".whisper_gui_tool" / "cache"
-                cache_dir.mkdir(parents=True, exist_ok=True)
-                srt_path = cache_dir / (self.media_path.stem + ".srt")
-                with open(srt_path, "w", encoding="utf-8") as f: f.write(srt_content)
+                srt_path = config.CACHE_DIR / (self.media_path.stem + ".srt")
+                os.replace(partial_path, srt_path)
+                if checkpoint_path.exists(): checkpoint_path.unlink()
                 self.finished.emit(str(srt_path))
         except Exception as e:
             self.error.emit(f"转写失败: {e}")
@@ -80,6 +194,121 @@ class TranscriptionWorker(QThread):
                     torch.cuda.empty_cache()
     def stop(self): self._is_running = False
 
+def make_calibration_clip(seconds=20, sample_rate=16000):
+    """合成一段类语音的测试音频：带谐波的缓变基频 + 4Hz 音节包络 + 停顿 + 底噪"""
+    rng = np.random.default_rng(0); t = np.arange(int(seconds * sample_rate)) / sample_rate
+    phase = 2 * np.pi * np.cumsum(140 + 30 * np.sin(2 * np.pi * 0.3 * t)) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.25 * t) > -0.5)
+    return (0.3 * voiced * syllables + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+def get_peak_rss_mb():
+    """当前进程的峰值常驻内存(MB)；Linux 的 ru_maxrss 单位为 KB、macOS 为字节，Windows 需要安装 psutil"""
+    if resource: return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    if psutil: return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    return None
+
+def get_gpu_memory_used_mb(device_index=0):
+    """通过 nvidia-smi 读取显卡当前已用显存(MB)，不可用时返回 None"""
+    try:
+        output = subprocess.run(["nvidia-smi", f"--id={device_index}", "--query-gpu=memory.used", "--format=csv,noheader,nounits"], capture_output=True, text=True, timeout=10, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        return float(output.stdout.strip().splitlines()[0]) if output.returncode == 0 else None
+    except (OSError, ValueError, IndexError, subprocess.SubprocessError): return None
+
+def measure_calibration_candidate(conn, model_path, device, compute_type, cpu_threads, clip_seconds, beam_size, decode_tokens):
+    """在独立子进程中测试一个候选配置，结果通过 conn 发回。
+    实时率 = 处理耗时 / 音频时长，越小越快。合成音频上 transcribe 的输出长度(无输出或幻觉到上限)会随精度变化，
+    因此直接调用编码器 + 解码器，并屏蔽结束符，让每个候选都解码固定的 decode_tokens 个 token，工作量完全一致。
+    内存 = 加载模型并解码后的峰值 RSS 减去加载前的峰值 (cpu)，或加载前后显卡已用显存之差 (cuda)"""
+    result = {'device': device, 'compute_type': compute_type, 'cpu_threads': cpu_threads, 'rtf': None, 'decoded_tokens': None, 'memory_mb': None}
+    try:
+        clip = make_calibration_clip(clip_seconds); rss_before = get_peak_rss_mb(); gpu_before = get_gpu_memory_used_mb() if device == "cuda" else None
+        model = WhisperModel(model_path, device=device, compute_type=compute_type, cpu_threads=cpu_threads or 0)
+        tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language="en" if model.model.is_multilingual else None)
+        prompt = list(tokenizer.sot_sequence) + [tokenizer.no_timestamps]; features = model.feature_extractor(clip)[:, :3000]
+        def decode(max_length):
+            output = model.model.generate(model.encode(features), [prompt], beam_size=beam_size, max_length=max_length, suppress_blank=False, suppress_tokens=[tokenizer.eot])
+            return len(output[0].sequences_ids[0])
+        decode(8) # 预热
+        start = time.perf_counter(); decoded_tokens = decode(decode_tokens); elapsed = time.perf_counter() - start
+        result.update({'rtf': elapsed / clip_seconds, 'decoded_tokens': decoded_tokens})
+        if device == "cuda":
+            gpu_after = get_gpu_memory_used_mb()
+            if gpu_before is not None and gpu_after is not None: result['memory_mb'] = round(gpu_after - gpu_before)
+        elif rss_before is not None: result['memory_mb'] = round(get_peak_rss_mb() - rss_before)
+    except Exception as e: result['error'] = str(e)
+    conn.send(result); conn.close()
+
+def get_calibration_candidates():
+    """列出本机可用的 (device, compute_type, cpu_threads) 组合"""
+    candidates = []
+    if has_cuda():
+        supported = ctranslate2.get_supported_compute_types("cuda")
+        candidates += [("cuda", ct, None) for ct in ("float16", "int8_float16", "int8") if ct in supported]
+    supported = ctranslate2.get_supported_compute_types("cpu"); cpu_count = os.cpu_count() or 1
+    thread_options = sorted({max(1, cpu_count // 4), max(1, cpu_count // 2), cpu_count})
+    candidates += [("cpu", ct, threads) for ct in ("int8", "int8_float32", "float32") if ct in supported for threads in thread_options]
+    return candidates
+
+class CalibrationWorker(QThread):
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(dict)
+    canceled = pyqtSignal()
+    error = pyqtSignal(str)
+    def __init__(self, model_path, beam_size=5, clip_seconds=30, decode_tokens=128, parent=None):
+        super().__init__(parent)
+        self.model_path = model_path; self.beam_size = beam_size; self.clip_seconds = clip_seconds; self.decode_tokens = decode_tokens; self._is_running = True
+        self.process = None; self.lock = threading.Lock()
+    def run(self):
+        try:
+            candidates = get_calibration_candidates(); results = []
+            for i, (device, compute_type, cpu_threads) in enumerate(candidates):
+                if not self._is_running: self.canceled.emit(); return
+                self.progress.emit(f"[{i + 1}/{len(candidates)}] {device} / {compute_type}" + (f" / {cpu_threads} 线程" if cpu_threads else ""))
+                result = self.measure(device, compute_type, cpu_threads)
+                if result is None: self.canceled.emit(); return
+                results.append(result)
+            if not self._is_running: self.canceled.emit(); return
+            per_device = {}
+            for r in results:
+                if r['rtf'] is not None and (r['device'] not in per_device or r['rtf'] < per_device[r['device']]['rtf']): per_device[r['device']] = r
+            if not per_device: raise RuntimeError(results[0].get('error', "没有可用的候选配置") if results else "没有可用的候选配置")
+            best = min(per_device.values(), key=lambda r: r['rtf'])
+            self.finished.emit({**best, 'model': Path(self.model_path).name, 'host': platform.node(), 'timestamp': datetime.now().isoformat(timespec='seconds'), 'per_device': per_device, 'candidates': results})
+        except Exception as e:
+            self.error.emit(f"校准失败: {e}")
+    def measure(self, device, compute_type, cpu_threads):
+        # 每个候选在独立的子进程中加载模型，互不影响峰值内存的读数，进程退出后内存/显存也会完全释放；取消时直接结束子进程
+        ctx = multiprocessing.get_context("spawn"); receiver, sender = ctx.Pipe(duplex=False)
+        with self.lock:
+            if not self._is_running: receiver.close(); sender.close(); return None
+            self.process = ctx.Process(target=measure_calibration_candidate, args=(sender, self.model_path, device, compute_type, cpu_threads, self.clip_seconds, self.beam_size, self.decode_tokens), daemon=True)
+            self.process.start()
+        sender.close()
+        try: result = receiver.recv()
+        except EOFError: result = None # 子进程被结束或异常退出，没有发回结果
+        finally:
+            self.process.join(); exit_code = self.process.exitcode; receiver.close()
+            with self.lock: self.process = None
+        if not self._is_running: return None
+        return result or {'device': device, 'compute_type': compute_type, 'cpu_threads': cpu_threads, 'rtf': None, 'decoded_tokens': None, 'memory_mb': None, 'error': f"测试进程异常退出 (代码 {exit_code})"}
+    def stop(self):
+        with self.lock:
+            self._is_running = False
+            if self.process and self.process.is_alive(): self.process.terminate()
+
+class ResyncWorker(QThread):
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+    def __init__(self, waveform_data, subtitles, parent=None):
+        super().__init__(parent)
+        self.time_axis = waveform_data[0]; self.rms_vals = waveform_data[3]
+        self.starts = np.array([sub['start_sec'] for sub in subtitles]); self.ends = np.array([sub['end_sec'] for sub in subtitles])
+    def run(self):
+        try: self.finished.emit(estimate_resync(self.time_axis, self.rms_vals, self.starts, self.ends))
+        except Exception as e: self.error.emit(f"字幕对齐失败: {e}")
+    def stop(self): pass # 估计过程很快且无法中途打断，关闭窗口时等待其结束即可
+
 class RetranscribeWorker(QThread):
     finished = pyqtSignal(str, int)
     error = pyqtSignal(str)